@@ -17,65 +17,123 @@ import cv2
 import numpy as np
 import os
 import json
+import logging
+import queue
+import threading
 from services.llm import text_to_llm
 from models.plat import Plat
-from pdf2image import convert_from_path
+import fitz  # PyMuPDF
 from paddleocr import PaddleOCR
 from dotenv import load_dotenv
 from PIL import Image
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+# Opt-in high-performance inference (TensorRT backend, FP16); set OCR_ENABLE_HPI=1 after
+# installing the HPI plugin with `paddleocr install_hpi_deps gpu`
+OCR_ENABLE_HPI = bool(os.getenv("OCR_ENABLE_HPI"))
+
 # Initialize PaddleOCR with layout analysis (structure parsing)
 OCR_MODEL = PaddleOCR(
     device="gpu",  # "gpu" for GPU, "cpu" for CPU
     lang="en",
     use_textline_orientation=False,
     use_doc_orientation_classify=False,
-    use_doc_unwarping=False
+    use_doc_unwarping=False,
+    text_recognition_batch_size=1,  # Keeps Paddle's memory arena small for long-lived server workers
+    enable_hpi=OCR_ENABLE_HPI,
+    # HPI's auto-config picks its own precision, so FP16 has to be requested from the backend
+    hpi_config={"backend": "tensorrt", "backend_config": {"precision": "fp16"}} if OCR_ENABLE_HPI else None
 )
 
+# Font used for OCR box labels in debug images
+LABEL_FONT = cv2.FONT_HERSHEY_SIMPLEX
+
+# Maximum number of rendered pages sent to OCR_MODEL.predict in one call
+OCR_BATCH_SIZE = 4
+
+# Minimum recognition confidence for a text block to be kept
+MIN_TEXT_SCORE = 0.0
+
+# Optional cap (in pixels) on the longest side of rendered pages; 0 keeps full 300 DPI pages.
+# PaddleOCR recognizes text from crops of this image, so measure accuracy before lowering it
+OCR_MAX_SIDE = int(os.getenv("OCR_MAX_SIDE", "0"))
+
+# Serializes OCR_MODEL.predict calls when several requests are served at once in one
+# process; the shared PaddleOCR predictor is not safe to call concurrently
+GPU_LOCK = threading.Lock()
+
+# Warm up the OCR model so the first request does not pay model initialization
+# (and, with HPI, TensorRT engine build) cost
+OCR_MODEL.predict(np.zeros((640, 640, 3), dtype=np.uint8))
+
+def iter_pdf_pages(pdf_path, dpi=300, max_side=None):
+    """
+    Render PDF pages one at a time as PIL images, in-process with PyMuPDF.
+    If max_side is given, pages are rendered at a lower zoom so neither side exceeds it.
+    """
+    with fitz.open(pdf_path) as doc:
+        for page in doc:
+            zoom = dpi / 72
+            if max_side:
+                zoom = min(zoom, max_side / max(page.rect.width, page.rect.height))
+            pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+            yield Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
+
 def pdf_to_images(pdf_path):
     """Convert PDF pages to a list of PIL images at 300 DPI."""
-    return convert_from_path(pdf_path, dpi=300)
+    return list(iter_pdf_pages(pdf_path, dpi=300))
+
+def _parse_ocr_result(ocr_result):
+    """
+    Extract recognized text blocks from a single PaddleOCR OCRResult.
+    Returns a list of (polygon, text) tuples.
+    """
+    json_result = ocr_result.json
+    
+    # Extract text results from the JSON structure
+    res = json_result.get('res', {})
+    rec_texts = res.get('rec_texts', [])
+    rec_polys = res.get('rec_polys', [])
+    rec_scores = res.get('rec_scores', [])
+    
+    # Keep blocks with non-blank text and a score at or above MIN_TEXT_SCORE
+    count = min(len(rec_texts), len(rec_polys), len(rec_scores))
+    scores = np.asarray(rec_scores[:count], dtype=np.float32)
+    has_text = np.fromiter((bool(t and t.strip()) for t in rec_texts[:count]), dtype=bool, count=count)
+    keep = has_text & (scores >= MIN_TEXT_SCORE)
+    text_blocks = [(rec_polys[i], rec_texts[i]) for i in np.flatnonzero(keep)]
+
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("blocks=%d scores=%s", len(text_blocks), scores[keep].tolist())
+    return text_blocks
 
 def detect_and_ocr(image_pil):
     """
     Detect text regions and run OCR using PaddleOCR's predict method.
-    Returns a list of recognized text blocks with their bounding boxes.
+    Returns a list of recognized text blocks with their bounding boxes, in image_pil's
+    coordinates; OCR_MAX_SIDE is applied when pages are rendered, not here.
     """
-    image_np = np.array(image_pil)
-    result = OCR_MODEL.predict(image_np)
+    # One page copy via Pillow's tobytes() (np.array would make two); the array is read-only,
+    # which is fine since PaddleOCR does not mutate its input
+    image_np = np.asarray(image_pil)
+    with GPU_LOCK:
+        result = OCR_MODEL.predict(image_np)
 
-    text_blocks = []
-    
-    if len(result) > 0:
-        ocr_result = result[0]  # Get the first OCRResult object
-        json_result = ocr_result.json
-        
-        # Extract text results from the JSON structure
-        res = json_result.get('res', {})
-        rec_texts = res.get('rec_texts', [])
-        rec_polys = res.get('rec_polys', [])
-        rec_scores = res.get('rec_scores', [])
-        
-        # Process each detected text
-        for i, (text, poly, score) in enumerate(zip(rec_texts, rec_polys, rec_scores)):
-            if text and text.strip():
-                text_blocks.append((poly, text))
-                print(f"[DEBUG] Detected text: '{text}' with confidence {score:.2f}")
-
-    print(f"[DEBUG] Total detected text blocks: {len(text_blocks)}")
+    text_blocks = _parse_ocr_result(result[0]) if len(result) > 0 else []
     return text_blocks, result
 
-def draw_ocr_boxes(image, ocr_result, output_path, font_scale=0.5, font_thickness=1):
+def draw_ocr_boxes(image, ocr_result, output_path, font_scale=0.5, font_thickness=1, draw_labels=True):
     """
     Draw OCR bounding boxes and text labels on the image.
     :param image: PIL Image
     :param ocr_result: PaddleOCR result (list containing OCRResult objects)
     :param output_path: Path to save the image with boxes
+    :param draw_labels: Whether to render the text and confidence label for each box
     """
-    image_np = np.array(image).copy()
+    image_np = np.array(image)  # Writable copy; the drawing calls below mutate it in place
 
     if len(ocr_result) > 0:
         ocr_data = ocr_result[0]  # Get the first OCRResult object
@@ -87,21 +145,26 @@ def draw_ocr_boxes(image, ocr_result, output_path, font_scale=0.5, font_thicknes
         rec_polys = res.get('rec_polys', [])
         rec_scores = res.get('rec_scores', [])
         
-        # Process each detected text
-        for text, poly, score in zip(rec_texts, rec_polys, rec_scores):
-            if text and text.strip():
-                points = np.array(poly, dtype=np.int32)  # Polygon coordinates
-                
-                # Draw bounding box
-                cv2.polylines(image_np, [points.reshape((-1, 1, 2))], isClosed=True, color=(0, 255, 0), thickness=2)
-
-                # Put text label near the box
-                text_pos = tuple(points[0])
+        # Keep only blocks with recognized text
+        blocks = [
+            (np.asarray(poly, dtype=np.int32).reshape((-1, 1, 2)), text, score)
+            for text, poly, score in zip(rec_texts, rec_polys, rec_scores)
+            if text and text.strip()
+        ]
+
+        # Draw all bounding boxes in a single call
+        if blocks:
+            cv2.polylines(image_np, [points for points, _, _ in blocks], isClosed=True, color=(0, 255, 0), thickness=2)
+
+        # Put text label near each box
+        if draw_labels:
+            for points, text, score in blocks:
+                text_pos = (int(points[0, 0, 0]), int(points[0, 0, 1]))
                 cv2.putText(
                     image_np,
                     f"{text} ({score:.2f})",
                     text_pos,
-                    cv2.FONT_HERSHEY_SIMPLEX,
+                    LABEL_FONT,
                     font_scale,
                     (255, 0, 0),
                     font_thickness,
@@ -109,8 +172,9 @@ def draw_ocr_boxes(image, ocr_result, output_path, font_scale=0.5, font_thicknes
                 )
 
     # Save the annotated image
-    cv2.imwrite(output_path, cv2.cvtColor(image_np, cv2.COLOR_RGB2BGR))
-    print(f"[DEBUG] Saved annotated image with OCR boxes at {output_path}")
+    cv2.cvtColor(image_np, cv2.COLOR_RGB2BGR, dst=image_np)
+    cv2.imwrite(output_path, image_np, [cv2.IMWRITE_PNG_COMPRESSION, 1])  # Fast encode, larger file
+    logger.debug("Saved annotated image with OCR boxes at %s", output_path)
 
 def merge_text_blocks(text_blocks):
     """Merge all OCR text blocks into a single string."""
@@ -123,76 +187,146 @@ def extract_plat_structured(text):
     try:
         return text_to_llm(llm_model, Plat, text)
     except Exception as e:
-        print(f"[LLM Extraction Error]: {e}")
+        logger.error("LLM extraction error: %s", e)
         return {}
 
-def extract_plat(pdf_path, output_dir=None, save_debug_files=False):
+def _render_worker(pdf_path, q_render, errors):
+    """Pipeline stage 1: rasterize the PDF one page at a time into q_render."""
+    try:
+        for idx, img_pil in enumerate(iter_pdf_pages(pdf_path, dpi=300, max_side=OCR_MAX_SIDE)):
+            q_render.put((idx, img_pil))
+    except Exception as e:
+        errors.append(e)
+    finally:
+        q_render.put(None)
+
+def _ocr_worker(q_render, q_ocr, errors):
+    """
+    Pipeline stage 2: OCR rendered pages and pass them on to q_ocr.
+    Pages already waiting in q_render are batched into a single predict call.
+    """
+    done = False
+    try:
+        while not done:
+            item = q_render.get()
+            if item is None:
+                break
+            batch = [item]
+            while len(batch) < OCR_BATCH_SIZE:
+                try:
+                    item = q_render.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    done = True
+                    break
+                batch.append(item)
+            if errors:
+                continue  # Drain upstream so the render stage never blocks on a full queue
+
+            with GPU_LOCK:
+                results = OCR_MODEL.predict([np.asarray(img_pil) for _, img_pil in batch])
+            for (idx, img_pil), ocr_result in zip(batch, results):
+                q_ocr.put((idx, _parse_ocr_result(ocr_result), [ocr_result], img_pil))
+    except Exception as e:
+        errors.append(e)
+        if not done:
+            while q_render.get() is not None:
+                pass
+    finally:
+        q_ocr.put(None)
+
+def _llm_worker(q_ocr, results, errors, base_name, debug_dir, draw_labels):
+    """Pipeline stage 3: write debug files and extract structured data per page."""
+    try:
+        while (item := q_ocr.get()) is not None:
+            if errors:
+                continue
+            idx, text_blocks, ocr_result, img_pil = item
+
+            # Save input image and bounding boxes preview if debug files requested
+            if debug_dir:
+                img_save_path = os.path.join(debug_dir, f"{base_name}_page{idx+1}_input.png")
+                img_pil.save(img_save_path, format="PNG", compress_level=1)
+                boxes_preview_path = os.path.join(debug_dir, f"{base_name}_page{idx+1}_boxes.png")
+                draw_ocr_boxes(img_pil, ocr_result, boxes_preview_path, draw_labels=draw_labels)
+
+            # Merge OCR results
+            all_text = merge_text_blocks(text_blocks)
+
+            # Save merged text if debug files requested
+            if debug_dir:
+                merged_txt_path = os.path.join(debug_dir, f"{base_name}_page{idx+1}_ocr_merged.txt")
+                with open(merged_txt_path, "w") as f:
+                    f.write(all_text)
+
+            logger.debug("OCR result for %s page %d:\n%s", base_name, idx + 1, all_text)
+
+            # Extract structured data
+            structured = extract_plat_structured(all_text)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Extracted JSON for %s page %d:\n%s", base_name, idx + 1,
+                             structured.model_dump_json() if isinstance(structured, Plat) else structured)
+
+            # Save JSON output if debug files requested
+            if debug_dir:
+                output_file = os.path.join(debug_dir, f"{base_name}_page{idx+1}.json")
+                with open(output_file, "w") as f:
+                    if isinstance(structured, Plat):
+                        f.write(structured.model_dump_json(indent=2))
+                    else:
+                        json.dump(structured, f, indent=2)
+
+            results[idx] = structured.model_dump() if isinstance(structured, Plat) else structured
+    except Exception as e:
+        errors.append(e)
+        while q_ocr.get() is not None:
+            pass
+
+def extract_plat(pdf_path, output_dir=None, save_debug_files=False, draw_labels=True):
     """
     Extract structured data from a single PDF plat document.
+
+    Pages flow through a three-stage pipeline (render -> OCR -> LLM) connected by
+    bounded queues, so the GPU OCRs one page while the next page is rasterized and
+    the previous one is sent to the LLM.
     
     Args:
         pdf_path (str): Path to the PDF file to process
         output_dir (str, optional): Directory to save debug files. If None, creates temp directory.
         save_debug_files (bool): Whether to save intermediate debug files
+        draw_labels (bool): Whether the debug box previews include per-box text labels (slower to render)
         
     Returns:
         dict: Extracted structured data from the plat document
     """
     # Create output directory if saving debug files
-    if save_debug_files and output_dir:
-        os.makedirs(output_dir, exist_ok=True)
+    debug_dir = output_dir if save_debug_files and output_dir else None
+    if debug_dir:
+        os.makedirs(debug_dir, exist_ok=True)
     
-    # Convert PDF to images
-    images = pdf_to_images(pdf_path)
     base_name = os.path.splitext(os.path.basename(pdf_path))[0]
     
-    # Process all pages and collect results
-    all_results = []
-    
-    for idx, img_pil in enumerate(images):
-        # Save input image if debug files requested
-        if save_debug_files and output_dir:
-            img_save_path = os.path.join(output_dir, f"{base_name}_page{idx+1}_input.png")
-            img_pil.save(img_save_path)
-
-        # Perform OCR
-        text_blocks, ocr_result = detect_and_ocr(img_pil)
-
-        # Save image with bounding boxes for debugging if requested
-        if save_debug_files and output_dir:
-            boxes_preview_path = os.path.join(output_dir, f"{base_name}_page{idx+1}_boxes.png")
-            draw_ocr_boxes(img_pil, ocr_result, boxes_preview_path)
-
-        # Merge OCR results
-        all_text = merge_text_blocks(text_blocks)
-        
-        # Save merged text if debug files requested
-        if save_debug_files and output_dir:
-            merged_txt_path = os.path.join(output_dir, f"{base_name}_page{idx+1}_ocr_merged.txt")
-            with open(merged_txt_path, "w") as f:
-                f.write(all_text)
+    # Per-page results keyed by page index, filled in by the LLM stage
+    results = {}
+    errors = []
+    q_render = queue.Queue(maxsize=4)
+    q_ocr = queue.Queue(maxsize=8)
 
-        print(f"[OCR Result for {base_name} page {idx+1}]\n", all_text)
-        
-        # Extract structured data
-        structured = extract_plat_structured(all_text)
-        print(f"[Extracted JSON for {base_name} page {idx+1}]\n", 
-              structured.model_dump_json() if isinstance(structured, Plat) else structured)
-
-        # Save JSON output if debug files requested
-        if save_debug_files and output_dir:
-            output_file = os.path.join(output_dir, f"{base_name}_page{idx+1}.json")
-            with open(output_file, "w") as f:
-                if isinstance(structured, Plat):
-                    json.dump(structured.model_dump(), f, indent=2)
-                else:
-                    json.dump(structured, f, indent=2)
-        
-        # Add to results collection
-        if isinstance(structured, Plat):
-            all_results.append(structured.model_dump())
-        else:
-            all_results.append(structured)
+    workers = [
+        threading.Thread(target=_render_worker, args=(pdf_path, q_render, errors), daemon=True),
+        threading.Thread(target=_ocr_worker, args=(q_render, q_ocr, errors), daemon=True),
+        threading.Thread(target=_llm_worker, args=(q_ocr, results, errors, base_name, debug_dir, draw_labels), daemon=True),
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    if errors:
+        raise errors[0]
+
+    all_results = [results[idx] for idx in sorted(results)]
     
     # Return the first page result (most common case) or all results if multiple pages
     return all_results[0] if len(all_results) == 1 else {"pages": all_results}
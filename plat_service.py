@@ -1,6 +1,9 @@
 import os
-import json
+import orjson
 import pdfplumber
+import fitz  # PyMuPDF
+import numpy as np
+from PIL import Image
 from docling.datamodel.base_models import InputFormat
 from docling.datamodel.pipeline_options import (
     PdfPipelineOptions,
@@ -10,14 +13,8 @@ from docling.document_converter import DocumentConverter, PdfFormatOption
 from services.llm import text_to_llm
 from models.plat import Plat
 
-# Document setup
-document_name = "Pioneer_Plat_20250512"
-source = f"plats/{document_name}.pdf"  # Path to your PDF
-
-# Output directories
-output_dir = f"output/{document_name}"
-drawings_dir = os.path.join(output_dir, "drawings")
-os.makedirs(drawings_dir, exist_ok=True)
+# Resolution used to rasterize drawing crops
+DRAWING_DPI = 300
 
 # Docling pipeline options
 pipeline_options = PdfPipelineOptions(
@@ -28,90 +25,124 @@ pipeline_options = PdfPipelineOptions(
 ocr_options = TesseractCliOcrOptions(force_full_page_ocr=True)
 pipeline_options.ocr_options = ocr_options
 
-# Create converter
+# Create converter once at module scope so its models are loaded a single time
 converter = DocumentConverter(
     format_options={
         InputFormat.PDF: PdfFormatOption(pipeline_options=pipeline_options)
     }
 )
 
-# Convert PDF
-print("🔄 Converting PDF with Docling...")
-result = converter.convert(source)
-
-# Export to Markdown
-plat_markdown = result.document.export_to_markdown()
-md_file_path = os.path.join(output_dir, f"{document_name}.md")
-with open(md_file_path, "w") as md_file:
-    md_file.write(plat_markdown)
-print(f"✅ Markdown saved: {md_file_path}")
-
-# Process text with LLM
-print("🤖 Processing text with LLM...")
-plat = text_to_llm(
-    llm_model="gpt-4.1",
-    feature_model=Plat,
-    document_text=plat_markdown
-)
-
-# Prepare JSON output
-plat_json = plat.model_dump()
-
-# Extract drawings and OCR labels using pdfplumber
-print("🖼️ Extracting drawings and OCR labels...")
-drawing_data = []
-
-with pdfplumber.open(source) as pdf:
-    for idx, pic in enumerate(result.document.pictures, start=1):
-        page_no = pic.prov[0].page_no
-        bbox = pic.prov[0].bbox
-        img_id = f"page{page_no}_pic{idx}"
-        img_path = os.path.join(drawings_dir, f"{img_id}.png")
-
-        try:
-            pdf_page = pdf.pages[page_no - 1]  # 0-based indexing
-            crop_box = (bbox.l, bbox.b, bbox.r, bbox.t)
-            region = pdf_page.within_bbox(crop_box)
-
-            # Rasterize region as PNG
-            img = region.to_image(resolution=300).original
-            img.save(img_path)
-            print(f"✅ Saved drawing: {img_id}")
-
-            # Extract OCR text from cropped region
-            words = region.extract_words()  # word-level OCR
-            ocr_text_blocks = [
-                {
-                    "text": word["text"],
-                    "bbox": {
-                        "x0": word["x0"],
-                        "top": word["top"],
-                        "x1": word["x1"],
-                        "bottom": word["bottom"]
+def process_plat(source, output_dir):
+    """Run the Docling + LLM pipeline on one plat PDF and write Markdown, drawings and JSON to output_dir."""
+    drawings_dir = os.path.join(output_dir, "drawings")
+    os.makedirs(drawings_dir, exist_ok=True)
+    document_name = os.path.splitext(os.path.basename(source))[0]
+
+    # Convert PDF
+    print("🔄 Converting PDF with Docling...")
+    result = converter.convert(source)
+
+    # Export to Markdown
+    plat_markdown = result.document.export_to_markdown()
+    md_file_path = os.path.join(output_dir, f"{document_name}.md")
+    with open(md_file_path, "w") as md_file:
+        md_file.write(plat_markdown)
+    print(f"✅ Markdown saved: {md_file_path}")
+
+    # Process text with LLM
+    print("🤖 Processing text with LLM...")
+    plat = text_to_llm(
+        llm_model="gpt-4.1",
+        feature_model=Plat,
+        document_text=plat_markdown
+    )
+
+    # Prepare JSON output
+    plat_json = plat.model_dump()
+
+    # Extract drawings and OCR labels using pdfplumber
+    print("🖼️ Extracting drawings and OCR labels...")
+    drawing_data = []
+
+    with pdfplumber.open(source) as pdf, fitz.open(source) as doc:
+        # Words and 300 DPI rasters are produced once per page and shared by every picture on it
+        page_words = {}
+        page_pixels = {}
+        scale = DRAWING_DPI / 72
+        for idx, pic in enumerate(result.document.pictures, start=1):
+            page_no = pic.prov[0].page_no
+            bbox = pic.prov[0].bbox
+            img_id = f"page{page_no}_pic{idx}"
+            img_path = os.path.join(drawings_dir, f"{img_id}.png")
+
+            try:
+                pdf_page = pdf.pages[page_no - 1]  # 0-based indexing
+                # Docling reports bottom-left origin boxes; pdfplumber and PyMuPDF use top-left
+                tl_bbox = bbox.to_top_left_origin(page_height=pdf_page.height)
+                crop_box = (tl_bbox.l, tl_bbox.t, tl_bbox.r, tl_bbox.b)
+
+                # Crop the region out of the page raster and save as PNG
+                if page_no not in page_pixels:
+                    pix = doc[page_no - 1].get_pixmap(matrix=fitz.Matrix(scale, scale), alpha=False)
+                    page_pixels[page_no] = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width, pix.n)
+                x0, top, x1, bottom = (max(0, round(v * scale)) for v in crop_box)
+                img = Image.fromarray(page_pixels[page_no][top:bottom, x0:x1])
+                img.save(img_path, format="PNG", compress_level=1)
+                print(f"✅ Saved drawing: {img_id}")
+
+                # Extract OCR text within the picture's bounding box. Only words lying wholly inside
+                # it are kept: a word straddling the edge is dropped, whereas the previous
+                # within_bbox filter cropped characters first and kept such words truncated
+                if page_no not in page_words:
+                    page_words[page_no] = pdf_page.extract_words()  # word-level OCR
+                x0, top, x1, bottom = crop_box
+                words = [
+                    word for word in page_words[page_no]
+                    if word["x0"] >= x0 and word["x1"] <= x1 and word["top"] >= top and word["bottom"] <= bottom
+                ]
+                ocr_text_blocks = [
+                    {
+                        "text": word["text"],
+                        "bbox": {
+                            "x0": word["x0"],
+                            "top": word["top"],
+                            "x1": word["x1"],
+                            "bottom": word["bottom"]
+                        }
                     }
-                }
-                for word in words
-            ]
-
-            drawing_data.append({
-                "page": page_no,
-                "picture_index": idx,
-                "drawing_id": img_id,
-                "file": img_path,
-                "bbox": bbox.to_dict(),
-                "ocr_labels": ocr_text_blocks
-            })
-        except Exception as e:
-            print(f"❌ Failed to extract drawing {img_id}: {e}")
-            continue
-
-# Add drawing data to JSON
-plat_json["drawings"] = drawing_data
-
-# Save JSON output
-json_file_path = os.path.join(output_dir, f"{document_name}.json")
-with open(json_file_path, "w") as json_file:
-    json.dump(plat_json, json_file, indent=4)
-print(f"✅ JSON saved: {json_file_path}")
-
-print("🎉 PlatMaster processing complete.")
\ No newline at end of file
+                    for word in words
+                ]
+
+                drawing_data.append({
+                    "page": page_no,
+                    "picture_index": idx,
+                    "drawing_id": img_id,
+                    "file": img_path,
+                    "bbox": bbox.to_dict(),
+                    "ocr_labels": ocr_text_blocks
+                })
+            except Exception as e:
+                print(f"❌ Failed to extract drawing {img_id}: {e}")
+                continue
+
+    # Add drawing data to JSON
+    plat_json["drawings"] = drawing_data
+
+    # Save JSON output
+    json_file_path = os.path.join(output_dir, f"{document_name}.json")
+    with open(json_file_path, "wb") as json_file:
+        json_file.write(orjson.dumps(plat_json, option=orjson.OPT_INDENT_2))
+    print(f"✅ JSON saved: {json_file_path}")
+
+    print("🎉 PlatMaster processing complete.")
+
+    return plat_json
+
+if __name__ == "__main__":
+    # Document setup
+    document_name = "Pioneer_Plat_20250512"
+    source = f"plats/{document_name}.pdf"  # Path to your PDF
+
+    # Output directories
+    output_dir = f"output/{document_name}"
+    process_plat(source, output_dir)
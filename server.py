@@ -12,16 +12,27 @@ the Free Software Foundation, either version 3 of the License, or
 
 from fastapi import FastAPI, File, UploadFile, HTTPException
 from fastapi.responses import JSONResponse
+import asyncio
 import tempfile
 import os
 from typing import Dict, Any
-from main import extract_plat
 import logging
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Size of each read when streaming an upload to disk
+UPLOAD_CHUNK_SIZE = 1 << 16
+
+def _pipeline():
+    """
+    Import the OCR + LLM pipeline on first use. Importing main builds the GPU OCR model,
+    so it stays out of module scope: the uvicorn supervisor process must not load it.
+    """
+    from main import extract_plat
+    return extract_plat
+
 app = FastAPI(
     title="PlatMaster API",
     description="Extract structured data from oil and gas well location plats",
@@ -48,18 +59,19 @@ async def extract_plat_data(file: UploadFile = File(...)):
     
     # Create temporary file to store uploaded PDF
     with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as temp_file:
+        temp_pdf_path = temp_file.name
         try:
-            # Write uploaded file to temporary location
-            content = await file.read()
-            temp_file.write(content)
-            temp_pdf_path = temp_file.name
+            # Stream uploaded file to temporary location in chunks
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                temp_file.write(chunk)
+            temp_file.flush()
             
-            logger.info(f"Processing uploaded file: {file.filename}")
+            logger.info("Processing uploaded file: %s", file.filename)
             
-            # Extract data using the refactored function
-            result = extract_plat(temp_pdf_path)
+            # Run the blocking OCR + LLM extraction off the event loop
+            result = await asyncio.to_thread(_pipeline(), temp_pdf_path)
             
-            logger.info(f"Successfully processed {file.filename}")
+            logger.info("Successfully processed %s", file.filename)
             
             return JSONResponse(
                 content=result,
@@ -67,7 +79,7 @@ async def extract_plat_data(file: UploadFile = File(...)):
             )
             
         except Exception as e:
-            logger.error(f"Error processing {file.filename}: {str(e)}")
+            logger.error("Error processing %s: %s", file.filename, e)
             raise HTTPException(
                 status_code=500,
                 detail=f"Error processing PDF: {str(e)}"
@@ -77,6 +89,18 @@ async def extract_plat_data(file: UploadFile = File(...)):
             if os.path.exists(temp_pdf_path):
                 os.unlink(temp_pdf_path)
 
+@app.on_event("startup")
+async def startup():
+    """Load the OCR model (and run its warmup) in each worker before it accepts requests."""
+    await asyncio.to_thread(_pipeline)
+
+@app.on_event("shutdown")
+async def shutdown():
+    """Close pooled LLM connections."""
+    # Imported here so the uvicorn supervisor never loads services.llm and its caches
+    from services import llm
+    await llm.aclose()
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint."""
@@ -97,4 +121,5 @@ async def root():
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=7777)
+    # Each worker process loads its own OCR model at startup; this supervisor process never does
+    uvicorn.run("server:app", host="0.0.0.0", port=7777, workers=int(os.getenv("UVICORN_WORKERS", "4")))
@@ -0,0 +1,23 @@
+class LLMError(Exception):
+    """An LLM request failed; carries the HTTP status code and response body when available."""
+
+    def __init__(self, message: str, status_code: int | None = None, body=None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.body = body
+
+class LLMTransientError(LLMError):
+    """A failure worth retrying: connection errors, rate limiting (429) and 5xx responses."""
+
+    def __init__(self, message: str, status_code: int | None = None, body=None, retry_after: float | None = None):
+        super().__init__(message, status_code, body)
+        self.retry_after = retry_after
+
+class LLMTimeout(LLMError):
+    """The LLM endpoint did not respond in time."""
+
+class LLMSchemaError(LLMError):
+    """The LLM response did not match the requested feature model; retrying will not help."""
+
+class LLMUnavailable(LLMError):
+    """The LLM endpoint kept failing with transient errors until retries were exhausted."""
@@ -1,34 +1,200 @@
-import json
+import asyncio
+import functools
+import hashlib
 import os
 import logging
+from collections.abc import Mapping
+from types import MappingProxyType
+import httpx
+import orjson
 import requests
-from pydantic import BaseModel
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ProtocolError, ReadTimeoutError
+from tenacity import retry, retry_if_exception_type, stop_after_attempt, wait_exponential_jitter
+from pydantic import BaseModel, ValidationError
 from dotenv import load_dotenv
+from services.exceptions import LLMError, LLMSchemaError, LLMTimeout, LLMTransientError, LLMUnavailable
+from services.llm_cache import cache as llm_cache
+from services.semantic_cache import cache as semantic_cache
 
 load_dotenv()
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-def text_to_llm(llm_model: str, feature_model: type[BaseModel], document_text: str) -> type[BaseModel]:
-    logger.info("Sending text to LLM for processing.")
+# How long cached extraction responses stay valid, in seconds
+CACHE_TTL = 7 * 86400
+
+# HTTP statuses treated as transient and retried with backoff
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Total attempts per LLM request, including the first
+MAX_ATTEMPTS = 6
+
+# Upper bound in seconds on a single retry wait, even when Retry-After asks for longer
+MAX_RETRY_WAIT = 60.0
+
+# (connect, read) timeouts in seconds for synchronous requests to Azure OpenAI
+REQUEST_TIMEOUT = (10.0, 120.0)
+
+# Shared session so synchronous calls reuse TCP/TLS connections to Azure OpenAI
+# (retries are handled by tenacity around each POST, not by the adapter)
+_session = requests.Session()
+_session.mount("https://", HTTPAdapter(pool_connections=32, pool_maxsize=64))
+
+def new_client() -> httpx.AsyncClient:
+    """Create an async LLM client; HTTP/2 multiplexes concurrent extractions over a few connections."""
+    return httpx.AsyncClient(
+        http2=True,
+        timeout=httpx.Timeout(120.0, connect=10.0),
+        limits=httpx.Limits(max_connections=32, max_keepalive_connections=32, keepalive_expiry=300)
+    )
+
+# Shared async client for the server's event loop. Its pooled connections bind to the first
+# loop that uses them, so code running its own loops should pass a client from new_client()
+_client = new_client()
+
+async def aclose() -> None:
+    """Close the shared async client; call on application shutdown."""
+    await _client.aclose()
+
+# Azure OpenAI REST API version used for chat completions, files and batches
+API_VERSION = "2024-10-01-preview"
+
+# Azure OpenAI resources (base URL, API key), resolved once at import
+_FINETUNE_RESOURCE = ("https://ul-openai-finetune-dev.openai.azure.com", os.getenv("AZURE_OPENAI_API_KEY_EAST2"))
+_DEFAULT_RESOURCE = ("https://ul-openai-api-dev.openai.azure.com", os.getenv("AZURE_OPENAI_API_KEY"))
+
+def azure_resource(llm_model: str) -> tuple[str, str]:
+    """Return the Azure OpenAI resource base URL and API key serving a deployment."""
+    return _FINETUNE_RESOURCE if llm_model == "gpt-4.1" else _DEFAULT_RESOURCE
+
+@functools.lru_cache(maxsize=None)
+def _endpoint(llm_model: str) -> tuple[str, Mapping[str, str]]:
+    """
+    Return the chat completions URL and request headers for an Azure OpenAI deployment,
+    built once per deployment. Headers are read-only since they are shared across threads.
+    """
+    base_url, api_key = azure_resource(llm_model)
+    url = f"{base_url}/openai/deployments/{llm_model}/chat/completions?api-version={API_VERSION}"
+    headers = MappingProxyType({
+        "Content-Type": "application/json",
+        "api-key": api_key
+    })
+    return url, headers
+
+def _retry_after(value: str | None) -> float | None:
+    """Parse a Retry-After header in seconds; the HTTP-date form falls back to backoff."""
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+_backoff = wait_exponential_jitter(initial=1, max=30)
+
+def _wait(retry_state) -> float:
+    """Exponential backoff with jitter, honoring the server's Retry-After up to MAX_RETRY_WAIT."""
+    retry_after = getattr(retry_state.outcome.exception(), "retry_after", None)
+    return min(max(_backoff(retry_state), retry_after or 0), MAX_RETRY_WAIT)
+
+def _log_retry(retry_state) -> None:
+    error = retry_state.outcome.exception()
+    logger.warning(
+        "LLM request failed (status %s), retrying in %.1fs (attempt %d of %d): %s",
+        error.status_code, retry_state.next_action.sleep, retry_state.attempt_number, MAX_ATTEMPTS, error
+    )
+
+def _raise_unavailable(retry_state):
+    error = retry_state.outcome.exception()
+    logger.error("LLM endpoint unavailable after %d attempts: %s", retry_state.attempt_number, error)
+    raise LLMUnavailable(
+        f"LLM endpoint unavailable after {retry_state.attempt_number} attempts: {error}",
+        status_code=error.status_code,
+        body=error.body
+    ) from error
+
+def _error_body(content: bytes):
+    """Decode an error response body once: parsed JSON when possible, otherwise text."""
+    try:
+        return orjson.loads(content)
+    except orjson.JSONDecodeError:
+        return content.decode(errors="replace")
+
+def _check_status(status_code: int, content: bytes, retry_after: str | None) -> None:
+    """Raise the LLMError subclass matching a non-200 response status."""
+    err = _error_body(content)
+    if status_code in RETRY_STATUSES:
+        raise LLMTransientError(f"LLM API returned {status_code}", status_code, err, _retry_after(retry_after))
+    if status_code != 200:
+        logger.error("LLM API Error: %s - %s", status_code, err)
+        raise LLMError(f"LLM API returned {status_code}", status_code, err)
+
+# Retries a sync or async call on transient failures, with backoff, up to MAX_ATTEMPTS
+retry_transient = retry(
+    retry=retry_if_exception_type((LLMTransientError, LLMTimeout)),
+    wait=_wait,
+    stop=stop_after_attempt(MAX_ATTEMPTS),
+    before_sleep=_log_retry,
+    retry_error_callback=_raise_unavailable
+)
+
+def send(method: str, url: str, headers: Mapping[str, str], **kwargs) -> requests.Response:
+    """
+    Send one request to Azure OpenAI on the shared session with REQUEST_TIMEOUT, raising
+    the matching LLMError subclass on failure. Not retried; wrap idempotent calls in retry_transient.
+    """
+    try:
+        response = _session.request(method, url, headers=headers, timeout=REQUEST_TIMEOUT, **kwargs)
+    except requests.Timeout as e:
+        raise LLMTimeout(f"LLM request timed out: {e}") from e
+    except requests.ConnectionError as e:
+        raise LLMTransientError(f"Could not reach LLM endpoint: {e}") from e
+    if not 200 <= response.status_code < 300:
+        _check_status(response.status_code, response.content, response.headers.get("Retry-After"))
+    return response
+
+@retry_transient
+def _post(url: str, headers: Mapping[str, str], body: bytes) -> bytes:
+    """POST a chat completion request and return the raw response body."""
+    try:
+        # Stream the body and read it once straight from urllib3, skipping requests' chunk joining
+        with _session.post(url, headers=headers, data=body, stream=True, timeout=REQUEST_TIMEOUT) as response:
+            if response.status_code != 200:
+                _check_status(response.status_code, response.content, response.headers.get("Retry-After"))
+            return response.raw.read(decode_content=True)
+    except (requests.Timeout, ReadTimeoutError) as e:
+        raise LLMTimeout(f"LLM request timed out: {e}") from e
+    except (requests.ConnectionError, ProtocolError) as e:
+        raise LLMTransientError(f"Could not reach LLM endpoint: {e}") from e
 
-    if llm_model == "gpt-4.1":
-        url = f"https://ul-openai-finetune-dev.openai.azure.com/openai/deployments/{llm_model}/chat/completions?api-version=2024-10-01-preview"
+@retry_transient
+async def _apost(client: httpx.AsyncClient, url: str, headers: Mapping[str, str], body: bytes) -> bytes:
+    """Async counterpart of _post."""
+    try:
+        response = await client.post(url, headers=headers, content=body)
+    except httpx.TimeoutException as e:
+        raise LLMTimeout(f"LLM request timed out: {e}") from e
+    except httpx.TransportError as e:
+        raise LLMTransientError(f"Could not reach LLM endpoint: {e}") from e
+    logger.debug("LLM response received over %s", response.http_version)
 
-        headers = {
-            "Content-Type": "application/json",
-            "api-key": os.getenv("AZURE_OPENAI_API_KEY_EAST2")
-        }
-    else:
-        url = f"https://ul-openai-api-dev.openai.azure.com/openai/deployments/{llm_model}/chat/completions?api-version=2024-10-01-preview"
+    if response.status_code != 200:
+        _check_status(response.status_code, response.content, response.headers.get("Retry-After"))
+    return response.content
 
-        headers = {
-            "Content-Type": "application/json",
-            "api-key": os.getenv("AZURE_OPENAI_API_KEY")
-        }
+@functools.lru_cache(maxsize=128)
+def schema_for(feature_model: type[BaseModel]) -> dict:
+    """JSON schema of feature_model, generated once per class."""
+    return feature_model.model_json_schema()
 
-    data = {
+@functools.lru_cache(maxsize=128)
+def _schema_key(feature_model: type[BaseModel]) -> bytes:
+    """Canonical (sorted-keys) JSON of the schema, serialized once per class for cache keys."""
+    return orjson.dumps(schema_for(feature_model), option=orjson.OPT_SORT_KEYS)
+
+def build_request(document_text: str, schema: dict) -> dict:
+    """Build the structured-output chat completion request body."""
+    return {
         "messages": [
             {
                 "role": "system",
@@ -44,25 +210,143 @@ def text_to_llm(llm_model: str, feature_model: type[BaseModel], document_text: s
             "json_schema": {
                 "name": "Extraction_Response",  # Add the name field explicitly
                 "strict": True,
-                "schema": feature_model.model_json_schema()
+                "schema": schema
             }
         },
         "seed": 7779,
         "stream": False
     }
 
-    try:
-        response = requests.post(url, headers=headers, json=data)
+# Placeholder for the user message in pre-serialized request templates
+_DOCUMENT_PLACEHOLDER = "__platmaster_document_text__"
+
+@functools.lru_cache(maxsize=128)
+def _request_template(feature_model: type[BaseModel]) -> bytes:
+    """
+    Request body for feature_model serialized once, with a placeholder as the user message.
+    The body does not depend on the deployment (it is in the URL), so it is keyed by model class.
+    """
+    return orjson.dumps(build_request(_DOCUMENT_PLACEHOLDER, schema_for(feature_model)))
 
-        if response.status_code != 200:
-            logger.error(f"LLM API Error: {response.status_code} - {response.text}")
-            raise Exception(response.json())
+def _request_body(feature_model: type[BaseModel], document_text: str) -> bytes:
+    """Serialized request body for document_text, substituted into the cached template."""
+    # The user message precedes response_format, so the first match is the placeholder
+    return _request_template(feature_model).replace(orjson.dumps(_DOCUMENT_PLACEHOLDER), orjson.dumps(document_text), 1)
 
-        response_json = response.json()
+def _cache_key(llm_model: str, feature_model: type[BaseModel], document_text: str) -> str:
+    """Content hash identifying a deterministic extraction; the schema acts as a prompt version."""
+    payload = b"|".join((
+        llm_model.encode(),
+        feature_model.__name__.encode(),
+        _schema_key(feature_model),
+        document_text.encode()
+    ))
+    return hashlib.sha256(payload).hexdigest()
+
+def cache_lookup(llm_model: str, feature_model: type[BaseModel], document_text: str) -> tuple[str | None, str, object]:
+    """
+    Check the exact-match cache, then the semantic cache when enabled.
+    Returns (cached content or None, exact cache key, document embedding or None).
+    """
+    key = _cache_key(llm_model, feature_model, document_text)
+    if llm_cache is not None and (cached := llm_cache.get(key)) is not None:
+        logger.info("Returning cached LLM response.")
+        return cached, key, None
+
+    embedding = None
+    if semantic_cache is not None:
+        cached, embedding = semantic_cache.lookup((llm_model, feature_model.__name__), document_text)
+        if cached is not None:
+            logger.info("Returning semantically cached LLM response.")
+            return cached, key, embedding
+    return None, key, embedding
+
+def cache_store(llm_model: str, feature_model: type[BaseModel], key: str, embedding, content: str) -> None:
+    """Record a validated response in the exact-match and semantic caches."""
+    if llm_cache is not None:
+        llm_cache.set(key, content, ttl=CACHE_TTL)
+    if semantic_cache is not None and embedding is not None:
+        semantic_cache.add((llm_model, feature_model.__name__), embedding, content)
+
+def response_content(response_json: dict) -> str:
+    """Return the message content of a chat completion response."""
+    try:
         content = response_json.get("choices", [])[0].get("message", {}).get("content", "{}")
-        logger.info("Text processing completed.")
-        return feature_model.model_validate_json(content)
+    except (IndexError, AttributeError) as e:
+        raise LLMSchemaError("LLM response has no message content", body=response_json) from e
+    return content
+
+def _parse_response(feature_model: type[BaseModel], body: bytes) -> tuple[BaseModel, str]:
+    """Decode a chat completion body and validate its content; returns (result, raw content)."""
+    try:
+        content = response_content(orjson.loads(body))
+    except orjson.JSONDecodeError as e:
+        raise LLMSchemaError("LLM response is not valid JSON", body=body) from e
+    logger.info("Text processing completed.")
+    try:
+        return feature_model.model_validate_json(content), content
+    except ValidationError as e:
+        logger.error("Schema mismatch: %s", e)
+        raise LLMSchemaError(f"LLM response does not match {feature_model.__name__}", body=content) from e
+
+def text_to_llm(llm_model: str, feature_model: type[BaseModel], document_text: str) -> type[BaseModel]:
+    url, headers = _endpoint(llm_model)
+    cached, key, embedding = cache_lookup(llm_model, feature_model, document_text)
+    if cached is not None:
+        return feature_model.model_validate_json(cached)
+
+    logger.info("Sending text to LLM for processing.")
+    body = _post(url, headers, _request_body(feature_model, document_text))
+    result, content = _parse_response(feature_model, body)
+    cache_store(llm_model, feature_model, key, embedding, content)
+    return result
+
+async def a_text_to_llm(
+    llm_model: str,
+    feature_model: type[BaseModel],
+    document_text: str,
+    client: httpx.AsyncClient | None = None
+) -> type[BaseModel]:
+    """
+    Async counterpart of text_to_llm. Uses the shared httpx client unless one is given; the
+    shared client only works on one event loop, so pass a client when calling from other loops.
+    """
+    url, headers = _endpoint(llm_model)
+    # Cache tiers do disk/network I/O and the semantic tier runs an embedding model
+    cached, key, embedding = await asyncio.to_thread(cache_lookup, llm_model, feature_model, document_text)
+    if cached is not None:
+        return feature_model.model_validate_json(cached)
+
+    logger.info("Sending text to LLM for processing.")
+    body = await _apost(client or _client, url, headers, _request_body(feature_model, document_text))
+    result, content = _parse_response(feature_model, body)
+    await asyncio.to_thread(cache_store, llm_model, feature_model, key, embedding, content)
+    return result
+
+async def text_to_llm_async(llm_model: str, feature_model: type[BaseModel], document_text: str) -> type[BaseModel]:
+    """
+    Run the blocking text_to_llm in a worker thread so async callers don't stall the event loop.
+    Unlike a_text_to_llm, this does not depend on the shared httpx client and works from any loop.
+    """
+    return await asyncio.to_thread(text_to_llm, llm_model, feature_model, document_text)
+
+async def batch_extract(items: list[tuple[str, type[BaseModel], str]], concurrency: int = 8) -> list[BaseModel | None]:
+    """
+    Run a_text_to_llm over (llm_model, feature_model, document_text) items concurrently,
+    with at most `concurrency` requests in flight. Results are returned in input order,
+    with None for items whose extraction failed; one bad document does not abort the rest.
+    Requests go through a client scoped to this call, so repeated asyncio.run(batch_extract(...))
+    calls in one process each get connections bound to their own event loop.
+    """
+    sem = asyncio.Semaphore(concurrency)
+
+    async with new_client() as client:
+        async def _bound(i, llm_model, feature_model, document_text):
+            async with sem:
+                try:
+                    return await a_text_to_llm(llm_model, feature_model, document_text, client)
+                except LLMError as e:
+                    logger.error("Extraction %d failed: %s", i, e)
+                    return None
 
-    except Exception as e:
-        logger.error(f"Error during LLM interaction: {str(e)}")
-        raise
\ No newline at end of file
+        return await asyncio.gather(*[_bound(i, *item) for i, item in enumerate(items)])
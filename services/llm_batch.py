@@ -0,0 +1,134 @@
+import time
+import logging
+import orjson
+from pydantic import BaseModel
+from services.exceptions import LLMError
+from services.llm import (
+    API_VERSION,
+    azure_resource,
+    build_request,
+    cache_lookup,
+    cache_store,
+    response_content,
+    retry_transient,
+    schema_for,
+    send,
+)
+
+logger = logging.getLogger(__name__)
+
+# Batch states after which Azure OpenAI will not make further progress
+_TERMINAL_STATES = {"completed", "failed", "expired", "cancelled"}
+
+@retry_transient
+def _get(url: str, headers: dict) -> bytes:
+    """GET a batch or file resource, retrying transient failures; safe since GETs are idempotent."""
+    return send("GET", url, headers).content
+
+def _download_lines(base_url: str, file_id: str, headers: dict) -> dict[str, dict]:
+    """Download a batch JSONL output or error file and key its lines by custom_id."""
+    content = _get(f"{base_url}/openai/files/{file_id}/content?api-version={API_VERSION}", headers)
+    lines = {}
+    for raw_line in content.splitlines():
+        if raw_line.strip():
+            line = orjson.loads(raw_line)
+            lines[line["custom_id"]] = line
+    return lines
+
+def _submit_group(llm_model: str, lines: list[dict], poll_interval: float) -> dict[str, dict]:
+    """
+    Run one Azure OpenAI batch job for a single deployment and return its
+    output and error lines keyed by custom_id.
+    """
+    base_url, api_key = azure_resource(llm_model)
+    headers = {"api-key": api_key}
+
+    # Upload the JSONL input file (POSTs are not retried, so a failure never creates duplicates)
+    jsonl = b"\n".join(orjson.dumps(line) for line in lines)
+    response = send(
+        "POST",
+        f"{base_url}/openai/files?api-version={API_VERSION}",
+        headers,
+        data={"purpose": "batch"},
+        files={"file": ("batch.jsonl", jsonl, "application/jsonl")}
+    )
+    input_file_id = orjson.loads(response.content)["id"]
+
+    # Create the batch job
+    response = send(
+        "POST",
+        f"{base_url}/openai/batches?api-version={API_VERSION}",
+        {**headers, "Content-Type": "application/json"},
+        data=orjson.dumps({
+            "input_file_id": input_file_id,
+            "endpoint": "/chat/completions",
+            "completion_window": "24h"
+        })
+    )
+    batch = orjson.loads(response.content)
+    logger.info("Submitted batch %s with %d requests for %s.", batch["id"], len(lines), llm_model)
+
+    # Poll until the job reaches a terminal state
+    while batch["status"] not in _TERMINAL_STATES:
+        time.sleep(poll_interval)
+        batch = orjson.loads(_get(f"{base_url}/openai/batches/{batch['id']}?api-version={API_VERSION}", headers))
+
+    output_file_id, error_file_id = batch.get("output_file_id"), batch.get("error_file_id")
+    if batch["status"] != "completed" or not (output_file_id or error_file_id):
+        raise LLMError(f"Batch {batch['id']} ended with status {batch['status']}", body=batch.get("errors"))
+
+    # Requests that failed inside the batch are written to the error file, not the output file
+    outputs = _download_lines(base_url, error_file_id, headers) if error_file_id else {}
+    if output_file_id:
+        outputs.update(_download_lines(base_url, output_file_id, headers))
+    return outputs
+
+def submit_batch(items: list[tuple[str, type[BaseModel], str]], poll_interval: float = 30.0) -> list[BaseModel | None]:
+    """
+    Extract features for many (llm_model, feature_model, document_text) items through
+    the Azure OpenAI Batch API. Use this for background backfills where latency does
+    not matter; interactive extraction should keep using text_to_llm.
+
+    Items already in the LLM caches are answered without being submitted. One batch
+    job is created per deployment. Results are returned in input order, with None for
+    items whose request failed inside an otherwise completed batch.
+    """
+    results = [None] * len(items)
+    pending = {}  # llm_model -> list of (index, feature_model, cache key, embedding)
+    lines = {}
+
+    for i, (llm_model, feature_model, document_text) in enumerate(items):
+        schema = schema_for(feature_model)
+        cached, key, embedding = cache_lookup(llm_model, feature_model, document_text)
+        if cached is not None:
+            results[i] = feature_model.model_validate_json(cached)
+            continue
+        pending.setdefault(llm_model, []).append((i, feature_model, key, embedding))
+        lines.setdefault(llm_model, []).append({
+            "custom_id": str(i),
+            "method": "POST",
+            "url": "/chat/completions",
+            "body": {"model": llm_model, **build_request(document_text, schema)}
+        })
+
+    for llm_model, group in pending.items():
+        outputs = _submit_group(llm_model, lines[llm_model], poll_interval)
+        for i, feature_model, key, embedding in group:
+            output = outputs.get(str(i))
+            if output is None:
+                logger.error("Batch request %d is missing from the batch output and error files", i)
+                continue
+            response = output.get("response") or {}
+            if response.get("status_code") != 200:
+                logger.error("Batch request %d failed: %s", i, output.get("error") or response)
+                continue
+            try:
+                content = response_content(response["body"])
+                results[i] = feature_model.model_validate_json(content)
+            except Exception as e:
+                # Keep the rest of a long-running batch when one response does not validate
+                logger.error("Batch request %d returned invalid content: %s", i, e)
+                continue
+            cache_store(llm_model, feature_model, key, embedding, content)
+
+    return results
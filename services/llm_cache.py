@@ -0,0 +1,70 @@
+import os
+import math
+import time
+import logging
+import threading
+from cachetools import TLRUCache
+from diskcache import Cache
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+class LLMCache:
+    """
+    Layered cache of raw LLM response content: an in-process LRU, then Redis
+    (when a URL is given), then a local disk cache. Hits from a slower tier
+    are promoted into the in-process LRU with their remaining lifetime, so
+    every tier honors the same TTL.
+    """
+
+    def __init__(self, maxsize: int = 1024, redis_url: str | None = None, disk_path: str | None = "./.llm_cache"):
+        # Entries are (value, absolute expiry time); the cache evicts them once expired
+        self._memory = TLRUCache(maxsize=maxsize, ttu=lambda _key, entry, _now: entry[1], timer=time.time)
+        self._lock = threading.Lock()  # cachetools caches are not thread-safe
+        self._redis = None
+        if redis_url:
+            import redis  # Only needed when a shared Redis tier is configured
+            self._redis = redis.Redis.from_url(redis_url)
+        self._disk = Cache(disk_path) if disk_path else None
+
+    def get(self, key: str) -> str | None:
+        with self._lock:
+            entry = self._memory.get(key)
+        if entry is not None:
+            return entry[0]
+
+        value, expires_at = None, math.inf
+        if self._redis is not None:
+            try:
+                raw, ttl_ms = self._redis.pipeline().get(key).pttl(key).execute()
+                if raw is not None:
+                    value = raw.decode()
+                    if ttl_ms >= 0:
+                        expires_at = time.time() + ttl_ms / 1000
+            except Exception as e:
+                logger.warning("Redis cache read failed: %s", e)
+        if value is None and self._disk is not None:
+            value, expire_time = self._disk.get(key, expire_time=True)
+            if expire_time is not None:
+                expires_at = expire_time
+
+        if value is not None:
+            with self._lock:
+                self._memory[key] = (value, expires_at)
+        return value
+
+    def set(self, key: str, value: str, ttl: int | None = None) -> None:
+        with self._lock:
+            self._memory[key] = (value, time.time() + ttl if ttl is not None else math.inf)
+        if self._redis is not None:
+            try:
+                self._redis.set(key, value, ex=ttl)
+            except Exception as e:
+                logger.warning("Redis cache write failed: %s", e)
+        if self._disk is not None:
+            self._disk.set(key, value, expire=ttl)
+
+# Process-wide cache; set LLM_NO_CACHE=1 for deterministic re-runs that always call the LLM
+cache = None if os.getenv("LLM_NO_CACHE") else LLMCache(redis_url=os.getenv("REDIS_URL"))
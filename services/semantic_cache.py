@@ -0,0 +1,63 @@
+import os
+import threading
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+class SemanticCache:
+    """
+    Embedding-based cache of LLM response content. Documents are embedded with a
+    sentence-transformers model and matched by cosine similarity in one FAISS
+    inner-product index per namespace, so different models/schemas never mix.
+
+    Plats that share boilerplate but differ in coordinates can embed very close
+    together, so keep the threshold high and only enable this for workloads
+    with true near-duplicate re-submissions.
+    """
+
+    def __init__(self, model_name: str = "all-MiniLM-L6-v2", threshold: float = 0.92):
+        # Heavy optional dependencies, only imported when the semantic cache is enabled
+        import faiss
+        from sentence_transformers import SentenceTransformer
+
+        self._faiss = faiss
+        self._encoder = SentenceTransformer(model_name)
+        self._threshold = threshold
+        self._indexes = {}
+        self._contents = {}
+        self._lock = threading.Lock()
+
+    def embed(self, document_text: str) -> np.ndarray:
+        """Return the L2-normalized embedding of document_text as a (1, dim) float32 array."""
+        return self._encoder.encode([document_text], normalize_embeddings=True).astype(np.float32)
+
+    def lookup(self, namespace: tuple, document_text: str) -> tuple[str | None, np.ndarray]:
+        """
+        Return (content, embedding) for the most similar cached document in namespace,
+        or (None, embedding) if nothing scores at or above the threshold.
+        """
+        embedding = self.embed(document_text)
+        with self._lock:
+            index = self._indexes.get(namespace)
+            if index is None or index.ntotal == 0:
+                return None, embedding
+            scores, ids = index.search(embedding, 1)
+            if scores[0][0] >= self._threshold:
+                return self._contents[namespace][ids[0][0]], embedding
+        return None, embedding
+
+    def add(self, namespace: tuple, embedding: np.ndarray, content: str) -> None:
+        with self._lock:
+            if namespace not in self._indexes:
+                self._indexes[namespace] = self._faiss.IndexFlatIP(embedding.shape[1])
+                self._contents[namespace] = []
+            self._indexes[namespace].add(embedding)
+            self._contents[namespace].append(content)
+
+# Opt-in: set LLM_SEMANTIC_CACHE=1 to enable; LLM_SEMANTIC_CACHE_THRESHOLD tunes the match cutoff
+cache = (
+    SemanticCache(threshold=float(os.getenv("LLM_SEMANTIC_CACHE_THRESHOLD", "0.92")))
+    if os.getenv("LLM_SEMANTIC_CACHE") and not os.getenv("LLM_NO_CACHE")
+    else None
+)
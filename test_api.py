@@ -8,46 +8,65 @@ the Free Software Foundation, either version 3 of the License, or
 (at your option) any later version.
 """
 
-import requests
+import asyncio
+import httpx
 import os
 
-def test_api():
-    """Test the PlatMaster API with a sample PDF file."""
+def _first_pdf(plats_dir):
+    """Return the first PDF DirEntry in plats_dir, stopping the scan as soon as one is found."""
+    with os.scandir(plats_dir) as entries:
+        for entry in entries:
+            if entry.name[-4:].lower() == '.pdf' and entry.is_file():
+                return entry
+    return None
+
+async def _check_endpoint(client, label, path):
+    """GET an informational endpoint and print its response."""
+    response = await client.get(path)
+    print(f"{label}: {response.status_code} - {response.json()}")
+
+async def _check_extraction(client, test_pdf, pdf_name):
+    """Upload a PDF to the extraction endpoint and print a summary of the result."""
+    print(f"\nTesting extraction with {test_pdf}...")
+
+    # Pass the open file (not its bytes): httpx sizes the multipart body from the file
+    # and streams it in chunks, so memory stays flat regardless of PDF size
+    with open(test_pdf, 'rb') as f:
+        files = {'file': (pdf_name, f, 'application/pdf')}
+        response = await client.post("/extract", files=files)
+
+    print(f"Extraction result: {response.status_code}")
+    if response.status_code == 200:
+        result = response.json()
+        print("Extraction successful!")
+        print(f"Result keys: {list(result.keys()) if isinstance(result, dict) else 'Not a dict'}")
+    else:
+        print(f"Error: {response.text}")
+
+async def test_api():
+    """Test the PlatMaster API with a sample PDF file, issuing all calls concurrently."""
     base_url = "http://localhost:8000"
-    
-    # Test health endpoint
-    print("Testing health endpoint...")
-    response = requests.get(f"{base_url}/health")
-    print(f"Health check: {response.status_code} - {response.json()}")
-    
-    # Test root endpoint
-    print("\nTesting root endpoint...")
-    response = requests.get(base_url)
-    print(f"Root endpoint: {response.status_code} - {response.json()}")
-    
-    # Test extraction endpoint with a PDF file
-    plats_dir = "plats"
-    if os.path.exists(plats_dir):
-        pdf_files = [f for f in os.listdir(plats_dir) if f.lower().endswith('.pdf')]
-        if pdf_files:
-            test_pdf = os.path.join(plats_dir, pdf_files[0])
-            print(f"\nTesting extraction with {test_pdf}...")
-            
-            with open(test_pdf, 'rb') as f:
-                files = {'file': (pdf_files[0], f, 'application/pdf')}
-                response = requests.post(f"{base_url}/extract", files=files)
-                
-            print(f"Extraction result: {response.status_code}")
-            if response.status_code == 200:
-                result = response.json()
-                print("Extraction successful!")
-                print(f"Result keys: {list(result.keys()) if isinstance(result, dict) else 'Not a dict'}")
+
+    # One client so all calls share pooled connections; extraction can take minutes
+    async with httpx.AsyncClient(base_url=base_url, timeout=None) as client:
+        print("Testing health and root endpoints...")
+        tasks = [
+            _check_endpoint(client, "Health check", "/health"),
+            _check_endpoint(client, "Root endpoint", "/")
+        ]
+
+        # Test extraction endpoint with a PDF file
+        plats_dir = "plats"
+        if os.path.exists(plats_dir):
+            test_pdf = _first_pdf(plats_dir)
+            if test_pdf:
+                tasks.append(_check_extraction(client, test_pdf.path, test_pdf.name))
             else:
-                print(f"Error: {response.text}")
+                print("No PDF files found in plats directory for testing")
         else:
-            print("No PDF files found in plats directory for testing")
-    else:
-        print("Plats directory not found - cannot test extraction endpoint")
+            print("Plats directory not found - cannot test extraction endpoint")
+
+        await asyncio.gather(*tasks)
 
 if __name__ == "__main__":
-    test_api()
+    asyncio.run(test_api())